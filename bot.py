@@ -7,18 +7,31 @@ Merged VPN helper bot:
 - Adds:
   * Clean WireGuard .conf files (scanner/import ready, no extra text).
   * Optional WireGuard QR code for quick scan.
-  * Chat cleanup: old inline menu message is deleted after config is sent.
+  * Chat cleanup: old inline menu message becomes a "config ready" note after config is sent.
   * Extra “Tools & Tips” submenu with multiple info items.
 """
 
+import asyncio
+import functools
+import hashlib
 import json
 import logging
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, fields
+from datetime import timedelta
 from io import BytesIO
 from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Awaitable, Callable, Optional
 
 from telegram import (
+    CallbackQuery,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
+    Message,
     Update,
 )
 from telegram.ext import (
@@ -27,13 +40,40 @@ from telegram.ext import (
     CommandHandler,
     ContextTypes,
 )
+from telegram.constants import ParseMode
+from telegram.error import RetryAfter, TelegramError
+from telegram.request import HTTPXRequest
+
+# Optional: QR codes for WireGuard configs (segno preferred, qrcode fallback)
+try:
+    import segno  # type: ignore
+except Exception:
+    segno = None
 
-# Optional: QR codes for WireGuard configs
 try:
     import qrcode  # type: ignore
 except Exception:
     qrcode = None
 
+# Optional: faster JSON encoding for the user data file
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None
+
+# Optional: faster event loop
+try:
+    import uvloop  # type: ignore
+except Exception:
+    uvloop = None
+
+# Optional: HTTP/2 to the Bot API (installed by python-telegram-bot[http2])
+try:
+    import h2  # type: ignore  # noqa: F401
+    HTTP_VERSION = "2"
+except Exception:
+    HTTP_VERSION = "1.1"
+
 # ========================
 # BASIC CONFIG
 # ========================
@@ -78,12 +118,59 @@ VPN_PROFILES = {
     },
 }
 
+# Read-only from here on, so hot handlers can't mutate server settings by accident
+VPN_PROFILES = MappingProxyType(
+    {code: MappingProxyType(profile) for code, profile in VPN_PROFILES.items()}
+)
+
 DEFAULT_COUNTRY = "nl"
 DEFAULT_PROTOCOL = PROTOCOL_WG
 
 WG_DNS = "1.1.1.1"
 WG_ALLOWED_IPS = "0.0.0.0/0, ::/0"
 
+# ========================
+# CALLBACK DATA
+# ========================
+
+# Interned once so keyboards and the HANDLERS table share the same str objects.
+CB_MENU_MAIN = sys.intern("menu_main")
+CB_CHOOSE_PROTOCOL = sys.intern("choose_protocol")
+CB_CHOOSE_COUNTRY = sys.intern("choose_country")
+CB_SET_PROTO_WG = sys.intern("set_proto_wg")
+CB_SET_PROTO_OVPN = sys.intern("set_proto_ovpn")
+CB_SET_COUNTRY = sys.intern("set_country_")  # + country code
+CB_GET_CONFIG = sys.intern("get_config")
+CB_WG_ANDROID = sys.intern("wg_android")
+CB_WG_IOS = sys.intern("wg_ios")
+CB_OVPN_ANDROID = sys.intern("ovpn_android")
+CB_OVPN_IOS = sys.intern("ovpn_ios")
+CB_OVPN_DESKTOP = sys.intern("ovpn_desktop")
+CB_HELP_ANDROID = sys.intern("help_android")
+CB_HELP_IOS = sys.intern("help_ios")
+CB_MENU_FAQ = sys.intern("menu_faq")
+CB_FAQ_OVERVIEW = sys.intern("faq_overview")
+CB_FAQ_LEGAL = sys.intern("faq_legal")
+CB_FAQ_PRIVACY = sys.intern("faq_privacy")
+CB_FAQ_SPEED = sys.intern("faq_speed")
+CB_FAQ_TROUBLESHOOT = sys.intern("faq_troubleshoot")
+CB_MENU_TOOLS = sys.intern("menu_tools")
+CB_TOOLS_BASICS = sys.intern("tools_basics")
+CB_TOOLS_WG_VS_OVPN = sys.intern("tools_wg_vs_ovpn")
+CB_TOOLS_PUBLIC_WIFI = sys.intern("tools_public_wifi")
+CB_TOOLS_STREAMING = sys.intern("tools_streaming")
+CB_TOOLS_GAMING = sys.intern("tools_gaming")
+CB_TOOLS_KILLSWITCH = sys.intern("tools_killswitch")
+CB_TOOLS_SPLIT_TUNNEL = sys.intern("tools_split_tunnel")
+CB_TOOLS_ANDROID_TIPS = sys.intern("tools_android_tips")
+CB_TOOLS_IOS_TIPS = sys.intern("tools_ios_tips")
+CB_TOOLS_PRIVACY_CHECK = sys.intern("tools_privacy_check")
+CB_TOOLS_FIREWALL = sys.intern("tools_firewall")
+CB_MENU_ACCOUNT = sys.intern("menu_account")
+CB_ACCOUNT_LAST_CFG = sys.intern("account_last_cfg")
+CB_ACCOUNT_DELETE = sys.intern("account_delete")
+CB_TOGGLE_LANG = sys.intern("toggle_lang")
+
 # ========================
 # LOGGING
 # ========================
@@ -99,43 +186,142 @@ logger = logging.getLogger(__name__)
 # PERSISTENCE
 # ========================
 
-def load_data() -> dict:
-    if DATA_FILE.exists():
-        try:
-            with DATA_FILE.open("r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception as e:
-            logger.warning("Failed to load data file: %s", e)
-            return {}
-    return {}
+@dataclass(slots=True)
+class UserState:
+    """Per-user bot state; one instance per Telegram user in `vpn_users.json`."""
+
+    profiles_created: int = 0
+    lang: str = "en"
+    protocol: str = DEFAULT_PROTOCOL
+    country: str = DEFAULT_COUNTRY
+    last_cfg_file: str = ""
+    last_cfg_filename: str = ""
+
 
+_USER_FIELDS = frozenset(f.name for f in fields(UserState))
 
-def save_data(data: dict) -> None:
+
+def load_data(path: Path = DATA_FILE) -> dict:
+    # one open() and no exists() stat: a missing file simply means no users yet
     try:
-        with DATA_FILE.open("w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        logger.error("Failed to save data file: %s", e)
-
-
-def get_user_record(data: dict, user_id: int) -> dict:
-    uid = str(user_id)
-    if uid not in data:
-        data[uid] = {
-            "profiles_created": 0,
-            "lang": "en",
-            "protocol": DEFAULT_PROTOCOL,
-            "country": DEFAULT_COUNTRY,
-            "last_cfg_file": "",
-            "last_cfg_filename": "",
-        }
-    else:
-        # ensure keys exist for older records
-        if "last_cfg_file" not in data[uid]:
-            data[uid]["last_cfg_file"] = ""
-        if "last_cfg_filename" not in data[uid]:
-            data[uid]["last_cfg_filename"] = ""
-    return data[uid]
+        raw_bytes = path.read_bytes()
+        raw = orjson.loads(raw_bytes) if orjson is not None else json.loads(raw_bytes)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:  # unreadable or not valid JSON
+        logger.warning("Failed to load data file: %s", e)
+        return {}
+    # JSON keys are strings; in memory users are keyed by the raw int id.
+    # Missing keys in older records fall back to the dataclass defaults.
+    return {
+        int(uid): UserState(**{k: v for k, v in rec.items() if k in _USER_FIELDS})
+        for uid, rec in raw.items()
+    }
+
+
+def _encode_data(data: dict) -> bytes:
+    # Compact on purpose: no indent means no big pretty-printed intermediate
+    # string on every save. Use dump_pretty() when a human needs to read it.
+    # Ids only become strings here, at flush time.
+    if orjson is not None:
+        # serializes UserState dataclasses natively; OPT_NON_STR_KEYS writes
+        # the int ids as JSON string keys without a re-keyed copy of the dict
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        {str(uid): asdict(user) for uid, user in data.items()},
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def dump_pretty(path: Path) -> None:
+    """Write an indented copy of the data file to `path` for debugging."""
+    with DATA_FILE.open("r", encoding="utf-8") as f:
+        records = json.load(f)
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(records, f, indent=2, ensure_ascii=False)
+
+
+class UserStore:
+    """
+    In-memory user records with a debounced write-behind to the data file.
+
+    The file is read once at startup. Handlers mutate records in place and
+    call mark_dirty(); a background task coalesces changes and rewrites the
+    file at most every `flush_delay` seconds from a worker thread, so no
+    callback reads or writes the disk itself.
+    """
+
+    def __init__(self, path: Path, flush_delay: float = 0.5) -> None:
+        self._path = path
+        self._flush_delay = flush_delay
+        self._data: dict[int, UserState] = {}
+        self._dirty: set[int] = set()
+        # user_id -> encoded last config; memory only, never written out
+        self._cfg_bytes: dict[int, bytes] = {}
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def get_user(self, user_id: int) -> UserState:
+        user = self._data.get(user_id)
+        if user is None:
+            user = self._data[user_id] = UserState()
+            self.mark_dirty(user_id)
+        return user
+
+    def delete_user(self, user_id: int) -> None:
+        self._cfg_bytes.pop(user_id, None)
+        if self._data.pop(user_id, None) is not None:
+            self.mark_dirty(user_id)
+
+    def get_cfg_bytes(self, user_id: int) -> Optional[bytes]:
+        return self._cfg_bytes.get(user_id)
+
+    def set_cfg_bytes(self, user_id: int, payload: bytes) -> None:
+        self._cfg_bytes[user_id] = payload
+
+    def mark_dirty(self, user_id: int) -> None:
+        self._dirty.add(user_id)
+        self._wakeup.set()
+
+    async def flush(self) -> None:
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        # encode on the loop so the snapshot is consistent, write off-loop
+        payload = _encode_data(self._data)
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._path.write_bytes, payload
+            )
+        except OSError as e:
+            logger.error("Failed to save data file: %s", e)
+            # retried on the next debounce tick, not only on the next change
+            self._dirty |= dirty
+            self._wakeup.set()
+
+    async def _flusher(self) -> None:
+        while not self._closing:
+            await self._wakeup.wait()
+            await asyncio.sleep(self._flush_delay)
+            self._wakeup.clear()
+            await self.flush()
+
+    async def start(self, application: Application) -> None:
+        """post_init hook: load the file and start the write-behind task."""
+        self._data = load_data(self._path)
+        self._flush_task = asyncio.create_task(self._flusher())
+
+    async def stop(self, application: Application) -> None:
+        """post_shutdown hook: stop the write-behind task after a last flush."""
+        self._closing = True
+        self._wakeup.set()
+        if self._flush_task is not None:
+            await self._flush_task
+        await self.flush()
+
+
+store = UserStore(DATA_FILE)
 
 
 # ========================
@@ -147,6 +333,59 @@ def get_user_ip_octet(user_id: int) -> int:
     return (user_id % 221) + 10
 
 
+_WG_CLIENT_TEMPLATE = (
+    "[Interface]\n"
+    "PrivateKey = REPLACE_WITH_CLIENT_PRIVATE_KEY\n"
+    "Address = {client_ip}\n"
+    "DNS = {dns}\n"
+    "\n"
+    "[Peer]\n"
+    "PublicKey = {server_public_key}\n"
+    "PresharedKey = REPLACE_WITH_OPTIONAL_PRESHARED_KEY\n"
+    "AllowedIPs = {allowed_ips}\n"
+    "Endpoint = {endpoint}\n"
+    "PersistentKeepalive = 25"
+).format_map
+
+_WG_SERVER_TEMPLATE = (
+    "[Peer]\n"
+    "PublicKey = REPLACE_WITH_CLIENT_PUBLIC_KEY\n"
+    "AllowedIPs = {client_ip}"
+).format_map
+
+_OVPN_TEMPLATE = """\
+client
+dev tun
+proto udp
+remote {remote}
+resolv-retry infinite
+nobind
+persist-key
+persist-tun
+remote-cert-tls server
+cipher AES-256-CBC
+auth SHA256
+verb 3
+
+<ca>
+# Paste your CA certificate here
+</ca>
+
+<cert>
+# Paste your client certificate here
+</cert>
+
+<key>
+# Paste your client private key here
+</key>
+
+# Optional tls-auth key
+<tls-auth>
+# Paste your tls-auth key here
+</tls-auth>
+key-direction 1""".format_map
+
+
 def generate_wireguard_client_and_server(user_id: int, country_code: str, platform: str):
     """
     Returns (client_config_clean, server_peer_snippet).
@@ -158,416 +397,688 @@ def generate_wireguard_client_and_server(user_id: int, country_code: str, platfo
     octet = get_user_ip_octet(user_id)
     client_ip = f"{profile['wg_subnet_prefix']}{octet}/32"
 
-    client_cfg = (
-        f"[Interface]\n"
-        f"PrivateKey = REPLACE_WITH_CLIENT_PRIVATE_KEY\n"
-        f"Address = {client_ip}\n"
-        f"DNS = {WG_DNS}\n"
-        f"\n"
-        f"[Peer]\n"
-        f"PublicKey = {profile['wg_server_public_key']}\n"
-        f"PresharedKey = REPLACE_WITH_OPTIONAL_PRESHARED_KEY\n"
-        f"AllowedIPs = {WG_ALLOWED_IPS}\n"
-        f"Endpoint = {profile['wg_endpoint']}\n"
-        f"PersistentKeepalive = 25\n"
-    )
+    client_cfg = _WG_CLIENT_TEMPLATE({
+        "client_ip": client_ip,
+        "dns": WG_DNS,
+        "server_public_key": profile["wg_server_public_key"],
+        "allowed_ips": WG_ALLOWED_IPS,
+        "endpoint": profile["wg_endpoint"],
+    })
+    server_snippet = _WG_SERVER_TEMPLATE({"client_ip": client_ip})
 
-    server_snippet = (
-        "[Peer]\n"
-        "PublicKey = REPLACE_WITH_CLIENT_PUBLIC_KEY\n"
-        f"AllowedIPs = {client_ip}\n"
-    )
+    return client_cfg, server_snippet
 
-    return client_cfg.strip(), server_snippet.strip()
+
+# OpenVPN configs only depend on the country, so they are rendered and
+# UTF-8 encoded once at import; the handler uploads the ready-made bytes.
+_OVPN_CONFIGS = MappingProxyType(
+    {code: _OVPN_TEMPLATE({"remote": p["ovpn_remote"]}) for code, p in VPN_PROFILES.items()}
+)
+_OVPN_CONFIG_BYTES = MappingProxyType(
+    {code: text.encode("utf-8") for code, text in _OVPN_CONFIGS.items()}
+)
 
 
 def generate_openvpn_client_config(user_id: int, country_code: str, platform: str) -> str:
-    profile = VPN_PROFILES[country_code]
-    text = []
-    text.append("client")
-    text.append("dev tun")
-    text.append("proto udp")
-    text.append(f"remote {profile['ovpn_remote']}")
-    text.append("resolv-retry infinite")
-    text.append("nobind")
-    text.append("persist-key")
-    text.append("persist-tun")
-    text.append("remote-cert-tls server")
-    text.append("cipher AES-256-CBC")
-    text.append("auth SHA256")
-    text.append("verb 3")
-    text.append("")
-    text.append("<ca>")
-    text.append("# Paste your CA certificate here")
-    text.append("</ca>")
-    text.append("")
-    text.append("<cert>")
-    text.append("# Paste your client certificate here")
-    text.append("</cert>")
-    text.append("")
-    text.append("<key>")
-    text.append("# Paste your client private key here")
-    text.append("</key>")
-    text.append("")
-    text.append("# Optional tls-auth key")
-    text.append("<tls-auth>")
-    text.append("# Paste your tls-auth key here")
-    text.append("</tls-auth>")
-    text.append("key-direction 1")
-    return "\n".join(text)
-
-
-def build_config_file_bytes(config_text: str, filename: str) -> BytesIO:
-    bio = BytesIO(config_text.encode("utf-8"))
-    bio.name = filename
-    return bio
+    return _OVPN_CONFIGS[country_code]
+
+
+@functools.lru_cache(maxsize=256)
+def build_config_file_bytes(config_text: str) -> bytes:
+    """
+    UTF-8 payload for a config document.
+
+    Sent as-is (PTB accepts raw bytes + filename), so there is no BytesIO
+    wrapper. Cached by text: OpenVPN configs only vary per country and a
+    WireGuard config only per (country, octet), so repeat clicks and
+    re-downloads reuse the same bytes object.
+    """
+    return config_text.encode("utf-8")
+
+
+# QR rendering is pure CPU and would block the event loop
+QR_ENABLED = segno is not None or qrcode is not None
+QR_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="qr")
+
+
+# blake2b(config bytes) -> PNG bytes, LRU-evicted. Checked on the loop before the
+# executor hop, so a repeat click costs a dict lookup instead of a render.
+QR_CACHE: OrderedDict[bytes, bytes] = OrderedDict()
+QR_CACHE_SIZE = 256
+
+# What a failed QR render can raise; anything else is a bug and propagates
+QR_ERRORS: tuple[type[Exception], ...] = (OSError, ValueError)
+if qrcode is not None:
+    QR_ERRORS += (qrcode.exceptions.DataOverflowError,)
+
+
+def _render_qr_sync(cfg_bytes: bytes) -> bytes:
+    """PNG bytes of the QR code for a WireGuard client config (runs in QR_POOL)."""
+    bio = BytesIO()
+    if segno is not None:
+        # writes the PNG itself: no Pillow, smaller file; make_qr because the
+        # WireGuard scanner can't read Micro QR
+        segno.make_qr(cfg_bytes, error="m").save(bio, kind="png", scale=6)
+    else:
+        qrcode.make(cfg_bytes).save(bio, format="PNG")
+    return bio.getvalue()
+
+
+async def render_qr(cfg_bytes: bytes) -> bytes:
+    """
+    Cached QR PNG for a WireGuard client config.
+
+    Takes the same encoded bytes that are uploaded as the .conf document, so
+    the text is encoded once per click. Rendering is deterministic, and the
+    config still carries the private key placeholder, so the same image can be
+    reused for every user it matches.
+    """
+    key = hashlib.blake2b(cfg_bytes, digest_size=16).digest()
+    png = QR_CACHE.get(key)
+    if png is not None:
+        QR_CACHE.move_to_end(key)
+        return png
+    png = await asyncio.get_running_loop().run_in_executor(QR_POOL, _render_qr_sync, cfg_bytes)
+    QR_CACHE[key] = png
+    if len(QR_CACHE) > QR_CACHE_SIZE:
+        QR_CACHE.popitem(last=False)
+    return png
 
 
 # ========================
 # TEXT BUILDERS
 # ========================
 
+_FLAGS = MappingProxyType({
+    "nl": "🇳🇱",
+    "de": "🇩🇪",
+    "us": "🇺🇸",
+    "sg": "🇸🇬",
+})
+
+# code -> "🇳🇱 Netherlands", built once. Index it directly when the code is
+# known to be valid; get_country_label() is for codes read back from the data
+# file, which may name a country that has since been removed.
+COUNTRY_LABELS = MappingProxyType({
+    code: f"{_FLAGS.get(code, '🌍')} {profile['name']}"
+    for code, profile in VPN_PROFILES.items()
+})
+
+
 def get_country_label(code: str) -> str:
-    profile = VPN_PROFILES.get(code)
-    if not profile:
-        return "Unknown"
-    flag = {
-        "nl": "🇳🇱",
-        "de": "🇩🇪",
-        "us": "🇺🇸",
-        "sg": "🇸🇬",
-    }.get(code, "🌍")
-    return f"{flag} {profile['name']}"
-
-
-def main_menu_text(user: dict) -> str:
-    protocol = user.get("protocol", DEFAULT_PROTOCOL)
-    country = user.get("country", DEFAULT_COUNTRY)
-    proto_label = "WireGuard 🛡️" if protocol == PROTOCOL_WG else "OpenVPN 🔐"
-    return (
-        "🛡️ *VPN Helper Bot*\n"
-        "────────────────────\n"
-        "This bot generates *clean VPN config templates* you can import into "
-        "real VPN apps on Android / iOS / Desktop.\n\n"
-        f"• Current protocol: *{proto_label}*\n"
-        f"• Current country: *{get_country_label(country)}*\n\n"
-        "Use the buttons below to choose protocol/country and get configs.\n"
-        "_Remember to replace placeholders with your real keys and certificates._"
-    )
+    return COUNTRY_LABELS.get(code, "Unknown")
 
 
-def android_help_text() -> str:
-    return (
-        "📱 *Android setup*\n\n"
-        "🛡️ WireGuard:\n"
-        "1. Install the official *WireGuard* app from Google Play.\n"
-        "2. Tap `+` → *Import from file or archive* or *Scan from QR code*.\n"
-        "3. Use the `.conf` file or QR from this bot.\n"
-        "4. Edit the placeholders with your real keys & endpoint if needed.\n"
-        "5. Toggle the tunnel *ON*.\n\n"
-        "🔐 OpenVPN:\n"
-        "1. Install *OpenVPN for Android* or *OpenVPN Connect*.\n"
-        "2. Import the `.ovpn` file from this bot.\n"
-        "3. Paste your CA / client cert / key where marked.\n"
-        "4. Connect and test your IP."
-    )
+# Fixed parts of the main menu text around the per-state lines
+MAIN_MENU_HEADER = (
+    "🛡️ *VPN Helper Bot*\n"
+    "────────────────────\n"
+    "This bot generates *clean VPN config templates* you can import into "
+    "real VPN apps on Android / iOS / Desktop.\n\n"
+)
+MAIN_MENU_FOOTER = (
+    "Use the buttons below to choose protocol/country and get configs.\n"
+    "_Remember to replace placeholders with your real keys and certificates._"
+)
 
 
-def ios_help_text() -> str:
-    return (
-        "🍎 *iPhone / iOS setup*\n\n"
-        "🛡️ WireGuard:\n"
-        "1. Install *WireGuard* from the App Store.\n"
-        "2. Send the `.conf` file or QR screenshot to your iPhone.\n"
-        "3. In WireGuard, tap *Add tunnel* → *Create from file* or *Scan QR code*.\n"
-        "4. Allow VPN permission and enable the tunnel.\n\n"
-        "🔐 OpenVPN:\n"
-        "1. Install *OpenVPN Connect* from the App Store.\n"
-        "2. Send the `.ovpn` file to your iPhone.\n"
-        "3. Import it into OpenVPN and add your certs/keys.\n"
-        "4. Connect and verify your new IP."
-    )
+def main_menu_text(user: UserState) -> str:
+    return _menu_cached(user.protocol, user.country, user.lang)[0]
 
 
-def faq_intro_text() -> str:
-    return (
-        "❓ *VPN FAQ*\n\n"
-        "• This bot only builds *config templates* (WireGuard & OpenVPN).\n"
-        "• You must run and configure your *own* VPN servers.\n"
-        "• Use VPNs for privacy, public Wi-Fi security, and neutral browsing.\n"
-        "• Always follow *local laws* and your provider's ToS."
-    )
+ANDROID_HELP_TEXT = (
+    "📱 *Android setup*\n\n"
+    "🛡️ WireGuard:\n"
+    "1. Install the official *WireGuard* app from Google Play.\n"
+    "2. Tap `+` → *Import from file or archive* or *Scan from QR code*.\n"
+    "3. Use the `.conf` file or QR from this bot.\n"
+    "4. Edit the placeholders with your real keys & endpoint if needed.\n"
+    "5. Toggle the tunnel *ON*.\n\n"
+    "🔐 OpenVPN:\n"
+    "1. Install *OpenVPN for Android* or *OpenVPN Connect*.\n"
+    "2. Import the `.ovpn` file from this bot.\n"
+    "3. Paste your CA / client cert / key where marked.\n"
+    "4. Connect and test your IP."
+)
 
 
-def faq_legal_text() -> str:
-    return (
-        "⚖️ *Legal & responsibility*\n\n"
-        "• VPN use is legal in many countries, restricted or banned in some.\n"
-        "• *You* are responsible for how you use these configs.\n"
-        "• Do **not** use VPN for abuse, crime, or anything harmful.\n"
-        "• This bot is for educational and personal privacy use only."
-    )
+IOS_HELP_TEXT = (
+    "🍎 *iPhone / iOS setup*\n\n"
+    "🛡️ WireGuard:\n"
+    "1. Install *WireGuard* from the App Store.\n"
+    "2. Send the `.conf` file or QR screenshot to your iPhone.\n"
+    "3. In WireGuard, tap *Add tunnel* → *Create from file* or *Scan QR code*.\n"
+    "4. Allow VPN permission and enable the tunnel.\n\n"
+    "🔐 OpenVPN:\n"
+    "1. Install *OpenVPN Connect* from the App Store.\n"
+    "2. Send the `.ovpn` file to your iPhone.\n"
+    "3. Import it into OpenVPN and add your certs/keys.\n"
+    "4. Connect and verify your new IP."
+)
 
 
-def faq_privacy_text() -> str:
-    return (
-        "🔐 *Privacy & data*\n\n"
-        "• This bot stores minimal data in `vpn_users.json`:\n"
-        "  – Your Telegram ID\n"
-        "  – Protocol & country choice\n"
-        "  – Language preference\n"
-        "  – Count of generated configs\n"
-        "  – Last config file text + filename (for easy re-download)\n"
-        "• It *does not* see your traffic after you connect to the VPN.\n"
-        "• Real logs depend on your own VPN server, not this bot.\n"
-        "• Use *Delete my data* to wipe your record from this bot."
-    )
+CHOOSE_PROTOCOL_TEXT = "⚙️ *Choose VPN protocol:*"
+CHOOSE_COUNTRY_TEXT = "🌍 *Choose VPN country:*"
+CONFIG_SEND_FAILED_TEXT = "⚠️ Couldn't send the config file. Please try again."
+ACCOUNT_DELETED_TEXT = "🗑️ Your bot data has been deleted.\n\nYou can use /start again anytime."
 
 
-def faq_speed_text() -> str:
-    return (
-        "🚀 *Speed & latency*\n\n"
-        "• Speed depends on distance to server, server resources, and your ISP.\n"
-        "• 🇳🇱 Netherlands, 🇩🇪 Germany, 🇺🇸 US, 🇸🇬 Singapore usually have good connectivity.\n"
-        "• Try different locations if one is slow.\n"
-        "• Avoid overloading the same VPS with heavy apps + VPN at the same time."
-    )
+FAQ_INTRO_TEXT = (
+    "❓ *VPN FAQ*\n\n"
+    "• This bot only builds *config templates* (WireGuard & OpenVPN).\n"
+    "• You must run and configure your *own* VPN servers.\n"
+    "• Use VPNs for privacy, public Wi-Fi security, and neutral browsing.\n"
+    "• Always follow *local laws* and your provider's ToS."
+)
 
 
-def faq_troubleshoot_text() -> str:
-    return (
-        "🛠️ *Troubleshooting*\n\n"
-        "🛡️ WireGuard:\n"
-        "• If tunnel will not connect:\n"
-        "  – Check keys on both client and server.\n"
-        "  – Confirm server `Endpoint` and port.\n"
-        "  – Ensure firewall allows UDP on your WireGuard port.\n"
-        "• Make sure server has a matching `[Peer]` entry with your client public key.\n\n"
-        "🔐 OpenVPN:\n"
-        "• Verify cipher/auth match between client and server.\n"
-        "• Ensure CA, client cert, and client key are correct.\n"
-        "• Use higher `verb` log level temporarily to debug."
-    )
+FAQ_LEGAL_TEXT = (
+    "⚖️ *Legal & responsibility*\n\n"
+    "• VPN use is legal in many countries, restricted or banned in some.\n"
+    "• *You* are responsible for how you use these configs.\n"
+    "• Do **not** use VPN for abuse, crime, or anything harmful.\n"
+    "• This bot is for educational and personal privacy use only."
+)
+
+
+FAQ_PRIVACY_TEXT = (
+    "🔐 *Privacy & data*\n\n"
+    "• This bot stores minimal data in `vpn_users.json`:\n"
+    "  – Your Telegram ID\n"
+    "  – Protocol & country choice\n"
+    "  – Language preference\n"
+    "  – Count of generated configs\n"
+    "  – Last config file text + filename (for easy re-download)\n"
+    "• It *does not* see your traffic after you connect to the VPN.\n"
+    "• Real logs depend on your own VPN server, not this bot.\n"
+    "• Use *Delete my data* to wipe your record from this bot."
+)
+
+
+FAQ_SPEED_TEXT = (
+    "🚀 *Speed & latency*\n\n"
+    "• Speed depends on distance to server, server resources, and your ISP.\n"
+    "• 🇳🇱 Netherlands, 🇩🇪 Germany, 🇺🇸 US, 🇸🇬 Singapore usually have good connectivity.\n"
+    "• Try different locations if one is slow.\n"
+    "• Avoid overloading the same VPS with heavy apps + VPN at the same time."
+)
+
+
+FAQ_TROUBLESHOOT_TEXT = (
+    "🛠️ *Troubleshooting*\n\n"
+    "🛡️ WireGuard:\n"
+    "• If tunnel will not connect:\n"
+    "  – Check keys on both client and server.\n"
+    "  – Confirm server `Endpoint` and port.\n"
+    "  – Ensure firewall allows UDP on your WireGuard port.\n"
+    "• Make sure server has a matching `[Peer]` entry with your client public key.\n\n"
+    "🔐 OpenVPN:\n"
+    "• Verify cipher/auth match between client and server.\n"
+    "• Ensure CA, client cert, and client key are correct.\n"
+    "• Use higher `verb` log level temporarily to debug."
+)
 
 
 # Tools & Tips texts (extra “features”)
 
-def tools_basics_text() -> str:
-    return (
-        "📚 *VPN basics*\n\n"
-        "A VPN creates an encrypted tunnel between your device and a remote server.\n"
-        "Your ISP sees only encrypted traffic; websites see the VPN server's IP."
-    )
+TOOLS_INTRO_TEXT = "🧰 *Tools & tips*\n\nSelect a topic below:"
 
+TOOLS_BASICS_TEXT = (
+    "📚 *VPN basics*\n\n"
+    "A VPN creates an encrypted tunnel between your device and a remote server.\n"
+    "Your ISP sees only encrypted traffic; websites see the VPN server's IP."
+)
 
-def tools_wg_vs_ovpn_text() -> str:
-    return (
-        "⚔️ *WireGuard vs OpenVPN*\n\n"
-        "• WireGuard: very fast, simple configs, modern crypto.\n"
-        "• OpenVPN: older, widely supported, more knobs & legacy options.\n"
-        "If you can choose, WireGuard is usually better for speed and battery."
-    )
 
+TOOLS_WG_VS_OVPN_TEXT = (
+    "⚔️ *WireGuard vs OpenVPN*\n\n"
+    "• WireGuard: very fast, simple configs, modern crypto.\n"
+    "• OpenVPN: older, widely supported, more knobs & legacy options.\n"
+    "If you can choose, WireGuard is usually better for speed and battery."
+)
 
-def tools_public_wifi_text() -> str:
-    return (
-        "☕ *Public Wi-Fi tips*\n\n"
-        "Always turn on your VPN before logging into accounts on public Wi-Fi.\n"
-        "Avoid using unknown Wi-Fi networks for banking if possible."
-    )
 
+TOOLS_PUBLIC_WIFI_TEXT = (
+    "☕ *Public Wi-Fi tips*\n\n"
+    "Always turn on your VPN before logging into accounts on public Wi-Fi.\n"
+    "Avoid using unknown Wi-Fi networks for banking if possible."
+)
 
-def tools_streaming_text() -> str:
-    return (
-        "🎬 *Streaming tips*\n\n"
-        "Streaming services may block some VPN IPs.\n"
-        "Choose servers closer to the streaming region and avoid overloaded VPS nodes."
-    )
 
+TOOLS_STREAMING_TEXT = (
+    "🎬 *Streaming tips*\n\n"
+    "Streaming services may block some VPN IPs.\n"
+    "Choose servers closer to the streaming region and avoid overloaded VPS nodes."
+)
 
-def tools_gaming_text() -> str:
-    return (
-        "🎮 *Gaming over VPN*\n\n"
-        "VPN adds latency. For gaming, use servers geographically close to you.\n"
-        "If ping is too high, prefer direct connection instead of VPN."
-    )
 
+TOOLS_GAMING_TEXT = (
+    "🎮 *Gaming over VPN*\n\n"
+    "VPN adds latency. For gaming, use servers geographically close to you.\n"
+    "If ping is too high, prefer direct connection instead of VPN."
+)
 
-def tools_killswitch_text() -> str:
-    return (
-        "🛑 *Kill switch idea*\n\n"
-        "A kill switch blocks all traffic if the VPN drops.\n"
-        "WireGuard on Linux can be combined with firewall rules to do this."
-    )
 
+TOOLS_KILLSWITCH_TEXT = (
+    "🛑 *Kill switch idea*\n\n"
+    "A kill switch blocks all traffic if the VPN drops.\n"
+    "WireGuard on Linux can be combined with firewall rules to do this."
+)
 
-def tools_split_tunnel_text() -> str:
-    return (
-        "🧩 *Split tunneling*\n\n"
-        "Split tunneling lets some apps use VPN and others go direct.\n"
-        "On Android this is per-app; on desktop you can script routes."
-    )
 
+TOOLS_SPLIT_TUNNEL_TEXT = (
+    "🧩 *Split tunneling*\n\n"
+    "Split tunneling lets some apps use VPN and others go direct.\n"
+    "On Android this is per-app; on desktop you can script routes."
+)
 
-def tools_android_tips_text() -> str:
-    return (
-        "🤖 *Extra Android tips*\n\n"
-        "Disable battery optimization for your VPN app.\n"
-        "Otherwise Android might kill it in the background."
-    )
 
+TOOLS_ANDROID_TIPS_TEXT = (
+    "🤖 *Extra Android tips*\n\n"
+    "Disable battery optimization for your VPN app.\n"
+    "Otherwise Android might kill it in the background."
+)
 
-def tools_ios_tips_text() -> str:
-    return (
-        "📲 *Extra iOS tips*\n\n"
-        "If tunnels randomly disconnect, check Low Data Mode / Low Power Mode.\n"
-        "iOS may be aggressive with background networking."
-    )
 
+TOOLS_IOS_TIPS_TEXT = (
+    "📲 *Extra iOS tips*\n\n"
+    "If tunnels randomly disconnect, check Low Data Mode / Low Power Mode.\n"
+    "iOS may be aggressive with background networking."
+)
 
-def tools_privacy_check_text() -> str:
-    return (
-        "🕵️ *Privacy check*\n\n"
-        "After connecting, always verify:\n"
-        "• IP on https://ipleak.net\n"
-        "• DNS servers on https://dnsleaktest.com"
-    )
 
+TOOLS_PRIVACY_CHECK_TEXT = (
+    "🕵️ *Privacy check*\n\n"
+    "After connecting, always verify:\n"
+    "• IP on https://ipleak.net\n"
+    "• DNS servers on https://dnsleaktest.com"
+)
 
-def tools_firewall_text() -> str:
-    return (
-        "🧱 *Firewall & ports*\n\n"
-        "Make sure your server firewall allows the WireGuard / OpenVPN port (UDP).\n"
-        "Otherwise clients will never connect, even with a perfect config."
-    )
+
+TOOLS_FIREWALL_TEXT = (
+    "🧱 *Firewall & ports*\n\n"
+    "Make sure your server firewall allows the WireGuard / OpenVPN port (UDP).\n"
+    "Otherwise clients will never connect, even with a perfect config."
+)
 
 
 # ========================
 # KEYBOARDS
 # ========================
 
-def main_menu_keyboard(user: dict) -> InlineKeyboardMarkup:
-    protocol = user.get("protocol", DEFAULT_PROTOCOL)
-    country = user.get("country", DEFAULT_COUNTRY)
+def _btn(label: str, cd: str) -> InlineKeyboardButton:
+    # interned so every keyboard references the same callback_data objects
+    return InlineKeyboardButton(label, callback_data=sys.intern(cd))
+
+
+def main_menu_keyboard(user: UserState) -> InlineKeyboardMarkup:
+    return _menu_cached(user.protocol, user.country, user.lang)[1]
+
+
+@functools.lru_cache(maxsize=64)
+def _menu_cached(protocol: str, country: str, lang: str) -> tuple[str, InlineKeyboardMarkup]:
+    """
+    Main menu text + keyboard for one (protocol, country, lang) state.
+
+    Both only depend on these three values, so the result is shared between
+    all users in the same state instead of being rebuilt on every tap.
+    """
     proto_label = "WireGuard 🛡️" if protocol == PROTOCOL_WG else "OpenVPN 🔐"
-    lang = user.get("lang", "en")
     lang_label = "English 🇬🇧" if lang == "en" else "Hindi 🇮🇳"
+    country_label = get_country_label(country)
+
+    text = (
+        f"{MAIN_MENU_HEADER}"
+        f"• Current protocol: *{proto_label}*\n"
+        f"• Current country: *{country_label}*\n\n"
+        f"{MAIN_MENU_FOOTER}"
+    )
 
     rows = [
         [
-            InlineKeyboardButton("🛡️ Get VPN Config", callback_data="get_config"),
+            _btn("🛡️ Get VPN Config", CB_GET_CONFIG),
         ],
         [
-            InlineKeyboardButton(f"⚙️ Protocol: {proto_label}", callback_data="choose_protocol"),
-            InlineKeyboardButton(f"🌍 {get_country_label(country)}", callback_data="choose_country"),
+            _btn(f"⚙️ Protocol: {proto_label}", CB_CHOOSE_PROTOCOL),
+            _btn(f"🌍 {country_label}", CB_CHOOSE_COUNTRY),
         ],
         [
-            InlineKeyboardButton("📱 Android help", callback_data="help_android"),
-            InlineKeyboardButton("🍎 iPhone help", callback_data="help_ios"),
+            _btn("📱 Android help", CB_HELP_ANDROID),
+            _btn("🍎 iPhone help", CB_HELP_IOS),
         ],
         [
-            InlineKeyboardButton("❓ FAQ", callback_data="menu_faq"),
-            InlineKeyboardButton("👤 My account", callback_data="menu_account"),
+            _btn("❓ FAQ", CB_MENU_FAQ),
+            _btn("👤 My account", CB_MENU_ACCOUNT),
         ],
         [
-            InlineKeyboardButton("🧰 Tools & Tips", callback_data="menu_tools"),
+            _btn("🧰 Tools & Tips", CB_MENU_TOOLS),
         ],
         [
             InlineKeyboardButton("🌐 Test IP", url="https://ipleak.net"),
             InlineKeyboardButton("🧪 DNS leak test", url="https://dnsleaktest.com"),
         ],
         [
-            InlineKeyboardButton(f"🌏 Language: {lang_label}", callback_data="toggle_lang"),
+            _btn(f"🌏 Language: {lang_label}", CB_TOGGLE_LANG),
         ],
     ]
-    return InlineKeyboardMarkup(rows)
+    return text, InlineKeyboardMarkup(rows)
 
 
-def protocol_keyboard() -> InlineKeyboardMarkup:
-    rows = [
-        [
-            InlineKeyboardButton("WireGuard 🛡️", callback_data="set_proto_wg"),
-            InlineKeyboardButton("OpenVPN 🔐", callback_data="set_proto_ovpn"),
-        ],
-        [
-            InlineKeyboardButton("⬅️ Back", callback_data="menu_main"),
-        ],
-    ]
-    return InlineKeyboardMarkup(rows)
-
-
-def country_keyboard() -> InlineKeyboardMarkup:
-    rows = []
-    for code in VPN_PROFILES.keys():
-        rows.append(
-            [
-                InlineKeyboardButton(
-                    get_country_label(code),
-                    callback_data=f"set_country_{code}",
-                )
-            ]
+# Keyboards that never depend on the user are built once at import and shared;
+# InlineKeyboardMarkup is immutable, so handing the same object to every
+# edit is safe.
+_BACK_ROW = (_btn("⬅️ Back", CB_MENU_MAIN),)
+
+BACK_ONLY_KB = InlineKeyboardMarkup((_BACK_ROW,))
+
+PROTOCOL_KB = InlineKeyboardMarkup(
+    (
+        (
+            _btn("WireGuard 🛡️", CB_SET_PROTO_WG),
+            _btn("OpenVPN 🔐", CB_SET_PROTO_OVPN),
+        ),
+        _BACK_ROW,
+    )
+)
+
+COUNTRY_KB = InlineKeyboardMarkup(
+    tuple((_btn(label, f"{CB_SET_COUNTRY}{code}"),) for code, label in COUNTRY_LABELS.items())
+    + (_BACK_ROW,)
+)
+
+FAQ_KB = InlineKeyboardMarkup(
+    (
+        (_btn("📚 Overview", CB_FAQ_OVERVIEW),),
+        (
+            _btn("⚖️ Legal", CB_FAQ_LEGAL),
+            _btn("🔐 Privacy", CB_FAQ_PRIVACY),
+        ),
+        (
+            _btn("🚀 Speed", CB_FAQ_SPEED),
+            _btn("🛠️ Troubleshooting", CB_FAQ_TROUBLESHOOT),
+        ),
+        _BACK_ROW,
+    )
+)
+
+ACCOUNT_KB = InlineKeyboardMarkup(
+    (
+        (_btn("📥 Last config", CB_ACCOUNT_LAST_CFG),),
+        (_btn("🗑️ Delete my data", CB_ACCOUNT_DELETE),),
+        _BACK_ROW,
+    )
+)
+
+TOOLS_KB = InlineKeyboardMarkup(
+    (
+        (_btn("📚 VPN basics", CB_TOOLS_BASICS),),
+        (
+            _btn("⚔️ WG vs OVPN", CB_TOOLS_WG_VS_OVPN),
+            _btn("☕ Public Wi-Fi", CB_TOOLS_PUBLIC_WIFI),
+        ),
+        (
+            _btn("🎬 Streaming", CB_TOOLS_STREAMING),
+            _btn("🎮 Gaming", CB_TOOLS_GAMING),
+        ),
+        (
+            _btn("🛑 Kill switch", CB_TOOLS_KILLSWITCH),
+            _btn("🧩 Split tunnel", CB_TOOLS_SPLIT_TUNNEL),
+        ),
+        (
+            _btn("🤖 Android tips", CB_TOOLS_ANDROID_TIPS),
+            _btn("📲 iOS tips", CB_TOOLS_IOS_TIPS),
+        ),
+        (
+            _btn("🕵️ Privacy check", CB_TOOLS_PRIVACY_CHECK),
+            _btn("🧱 Firewall", CB_TOOLS_FIREWALL),
+        ),
+        _BACK_ROW,
+    )
+)
+
+WG_PLATFORM_KB = InlineKeyboardMarkup(
+    (
+        (
+            _btn("📱 Android", CB_WG_ANDROID),
+            _btn("🍎 iOS", CB_WG_IOS),
+        ),
+        _BACK_ROW,
+    )
+)
+
+OVPN_PLATFORM_KB = InlineKeyboardMarkup(
+    (
+        (
+            _btn("📱 Android", CB_OVPN_ANDROID),
+            _btn("🍎 iOS", CB_OVPN_IOS),
+            _btn("💻 Desktop", CB_OVPN_DESKTOP),
+        ),
+        _BACK_ROW,
+    )
+)
+
+
+# ========================
+# SENDING
+# ========================
+
+class ChatThrottled(Exception):
+    """A call was dropped because its chat's next send slot is too far away."""
+
+
+class TgSender:
+    """
+    Single funnel for outgoing Telegram calls.
+
+    Telegram allows a bot roughly 30 messages per second overall and about one
+    per second into any single chat. Every edit / reply / document goes
+    through here, where at most `rate` calls may start in any rolling second,
+    at most `rate` may be in flight at once, and calls into the same chat are
+    held to `chat_rate` per second after a short `chat_burst`. A 429 that
+    still gets through pushes that chat's next slot out by `retry_after` and
+    the call is retried once.
+
+    Waiting happens inside the calling handler, which occupies one of PTB's
+    shared update slots, so it is bounded: a call whose chat slot is more
+    than `max_chat_wait` seconds away raises ChatThrottled instead of
+    sleeping (the callback has already been answered by then). Edits to one
+    message are coalesced as well: while one waits for its slot, later edits
+    just replace its content and return, so a user mashing a button holds at
+    most one waiting task per message and the last tap wins.
+
+    Edits that would re-post the text and keyboard a message already shows are
+    dropped: they cost a request and Telegram rejects them anyway.
+    """
+
+    def __init__(
+        self,
+        rate: int = 30,
+        chat_rate: float = 1.0,
+        chat_burst: int = 3,
+        max_chat_wait: float = 2.0,
+        edit_memory: int = 1024,
+    ) -> None:
+        self._rate = rate
+        self._in_flight = asyncio.Semaphore(rate)
+        self._bucket_lock = asyncio.Lock()
+        self._started: deque[float] = deque()
+        self._chat_interval = 1.0 / chat_rate
+        self._chat_slack = (chat_burst - 1) * self._chat_interval
+        self._max_chat_wait = max_chat_wait
+        # chat_id -> monotonic time the chat's bucket is fully drained at
+        self._chat_next: dict[int, float] = {}
+        # (chat_id, message_id) -> (text, markup, parse_mode) waiting for a slot
+        self._pending_edit: dict[tuple[int, int], tuple] = {}
+        # (chat_id, message_id) -> (text, markup, parse_mode) last sent to it
+        self._last_edit: OrderedDict[tuple[int, int], tuple] = OrderedDict()
+        self._edit_memory = edit_memory
+
+    async def _take_token(self) -> None:
+        async with self._bucket_lock:
+            while True:
+                now = time.monotonic()
+                while self._started and now - self._started[0] >= 1.0:
+                    self._started.popleft()
+                if len(self._started) < self._rate:
+                    self._started.append(now)
+                    return
+                await asyncio.sleep(1.0 - (now - self._started[0]))
+
+    async def _take_chat_slot(self, chat_id: int) -> None:
+        # Reserve the slot before sleeping so concurrent callers for the same
+        # chat line up one interval apart instead of waking together. A slot
+        # too far out is refused without reserving it.
+        now = time.monotonic()
+        drained_at = max(now, self._chat_next.get(chat_id, now))
+        slot = max(now, drained_at - self._chat_slack)
+        if slot - now > self._max_chat_wait:
+            raise ChatThrottled(f"chat {chat_id} is throttled for {slot - now:.1f}s")
+        self._chat_next[chat_id] = drained_at + self._chat_interval
+        if len(self._chat_next) > 4096:
+            self._chat_next = {c: t for c, t in self._chat_next.items() if t > now}
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _send(
+        self,
+        chat_id: Optional[int],
+        method: Callable[..., Awaitable[Any]],
+        args: tuple,
+        kwargs: dict,
+    ) -> Any:
+        # the chat slot for the first attempt is already taken
+        for attempt in (0, 1):
+            await self._take_token()
+            try:
+                async with self._in_flight:
+                    return await method(*args, **kwargs)
+            except RetryAfter as e:
+                delay = e.retry_after
+                if isinstance(delay, timedelta):
+                    delay = delay.total_seconds()
+                logger.warning("Flood control for chat %s, retry in %ss", chat_id, delay)
+                if chat_id is not None:
+                    # later calls for this chat wait (or are refused) in
+                    # _take_chat_slot until the penalty is over
+                    self._chat_next[chat_id] = time.monotonic() + delay + self._chat_slack
+                if attempt or delay > self._max_chat_wait:
+                    raise
+            if chat_id is not None:
+                await self._take_chat_slot(chat_id)
+            else:
+                await asyncio.sleep(delay)
+
+    async def _call(
+        self,
+        chat_id: Optional[int],
+        method: Callable[..., Awaitable[Any]],
+        *args,
+        **kwargs,
+    ) -> Any:
+        if chat_id is not None:
+            await self._take_chat_slot(chat_id)
+        return await self._send(chat_id, method, args, kwargs)
+
+    async def edit(
+        self,
+        query: CallbackQuery,
+        text: str,
+        markup: Optional[InlineKeyboardMarkup] = None,
+        parse_mode: Optional[str] = ParseMode.MARKDOWN,
+    ) -> Any:
+        message = query.message
+        if message is None:
+            return await self._call(
+                None,
+                query.edit_message_text,
+                text,
+                reply_markup=markup,
+                disable_web_page_preview=True,
+                parse_mode=parse_mode,
+            )
+
+        chat_id = message.chat_id
+        key = (chat_id, message.message_id)
+        if key in self._pending_edit:
+            # an earlier edit is already waiting for this chat's slot; it will
+            # send this content instead
+            self._pending_edit[key] = (text, markup, parse_mode)
+            return None
+
+        self._pending_edit[key] = (text, markup, parse_mode)
+        try:
+            await self._take_chat_slot(chat_id)
+        finally:
+            text, markup, parse_mode = edit = self._pending_edit.pop(key)
+
+        shown = self._last_edit.get(key)
+        if (
+            shown is not None
+            and shown[0] == text
+            and shown[1] is markup
+            and shown[2] == parse_mode
+        ):
+            return None
+
+        # recorded before sending so identical taps during the request are
+        # dropped too; forgotten again if the edit fails
+        self._last_edit[key] = edit
+        self._last_edit.move_to_end(key)
+        if len(self._last_edit) > self._edit_memory:
+            self._last_edit.popitem(last=False)
+        try:
+            return await self._send(
+                chat_id,
+                query.edit_message_text,
+                (text,),
+                {
+                    "reply_markup": markup,
+                    "disable_web_page_preview": True,
+                    "parse_mode": parse_mode,
+                },
+            )
+        except BaseException:
+            if self._last_edit.get(key) is edit:
+                del self._last_edit[key]
+            raise
+
+    async def reply(
+        self,
+        message: Message,
+        text: str,
+        markup: Optional[InlineKeyboardMarkup] = None,
+        parse_mode: Optional[str] = ParseMode.MARKDOWN,
+    ) -> Any:
+        return await self._call(
+            message.chat_id,
+            message.reply_text,
+            text,
+            reply_markup=markup,
+            disable_web_page_preview=True,
+            parse_mode=parse_mode,
         )
-    rows.append([InlineKeyboardButton("⬅️ Back", callback_data="menu_main")])
-    return InlineKeyboardMarkup(rows)
 
+    async def document(self, message: Message, **kwargs) -> Any:
+        return await self._call(message.chat_id, message.reply_document, **kwargs)
 
-def faq_keyboard() -> InlineKeyboardMarkup:
-    rows = [
-        [InlineKeyboardButton("📚 Overview", callback_data="faq_overview")],
-        [
-            InlineKeyboardButton("⚖️ Legal", callback_data="faq_legal"),
-            InlineKeyboardButton("🔐 Privacy", callback_data="faq_privacy"),
-        ],
-        [
-            InlineKeyboardButton("🚀 Speed", callback_data="faq_speed"),
-            InlineKeyboardButton("🛠️ Troubleshooting", callback_data="faq_troubleshoot"),
-        ],
-        [InlineKeyboardButton("⬅️ Back", callback_data="menu_main")],
-    ]
-    return InlineKeyboardMarkup(rows)
+    async def photo(self, message: Message, **kwargs) -> Any:
+        return await self._call(message.chat_id, message.reply_photo, **kwargs)
 
 
-def account_keyboard() -> InlineKeyboardMarkup:
-    rows = [
-        [
-            InlineKeyboardButton("📥 Last config", callback_data="account_last_cfg"),
-        ],
-        [
-            InlineKeyboardButton("🗑️ Delete my data", callback_data="account_delete"),
-        ],
-        [
-            InlineKeyboardButton("⬅️ Back", callback_data="menu_main"),
-        ],
-    ]
-    return InlineKeyboardMarkup(rows)
+SEND_RATE = 30
+sender = TgSender(SEND_RATE)
 
+# Updates handled at once. PTB processes them one by one by default, which
+# would leave TgSender's in-flight cap and rolling bucket idle. The slots are
+# shared by all chats; what keeps one busy chat from filling them is that
+# TgSender bounds each chat's waiting (max_chat_wait, one pending edit per
+# message), so a handler holds a slot for a couple of seconds at most.
+CONCURRENT_UPDATES = 64
 
-def tools_keyboard() -> InlineKeyboardMarkup:
-    rows = [
-        [InlineKeyboardButton("📚 VPN basics", callback_data="tools_basics")],
-        [
-            InlineKeyboardButton("⚔️ WG vs OVPN", callback_data="tools_wg_vs_ovpn"),
-            InlineKeyboardButton("☕ Public Wi-Fi", callback_data="tools_public_wifi"),
-        ],
-        [
-            InlineKeyboardButton("🎬 Streaming", callback_data="tools_streaming"),
-            InlineKeyboardButton("🎮 Gaming", callback_data="tools_gaming"),
-        ],
-        [
-            InlineKeyboardButton("🛑 Kill switch", callback_data="tools_killswitch"),
-            InlineKeyboardButton("🧩 Split tunnel", callback_data="tools_split_tunnel"),
-        ],
-        [
-            InlineKeyboardButton("🤖 Android tips", callback_data="tools_android_tips"),
-            InlineKeyboardButton("📲 iOS tips", callback_data="tools_ios_tips"),
-        ],
-        [
-            InlineKeyboardButton("🕵️ Privacy check", callback_data="tools_privacy_check"),
-            InlineKeyboardButton("🧱 Firewall", callback_data="tools_firewall"),
-        ],
-        [InlineKeyboardButton("⬅️ Back", callback_data="menu_main")],
-    ]
-    return InlineKeyboardMarkup(rows)
+# Connections for Bot API calls. At most SEND_RATE sends are in flight through
+# TgSender; callback answers bypass it, but each running update has at most one
+# of those open. Sized for both, so no call waits for a free connection.
+HTTP_POOL_SIZE = CONCURRENT_UPDATES + SEND_RATE
 
 
 # ========================#
@@ -575,521 +1086,346 @@ def tools_keyboard() -> InlineKeyboardMarkup:
 # ========================
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    data = load_data()
-    user = get_user_record(data, update.effective_user.id)
-    save_data(data)
+    user = store.get_user(update.effective_user.id)
 
     text = main_menu_text(user)
     keyboard = main_menu_keyboard(user)
 
     if update.message:
-        await update.message.reply_text(
-            text,
-            reply_markup=keyboard,
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
+        await sender.reply(update.message, text, keyboard)
     elif update.callback_query:
         query = update.callback_query
         await query.answer()
-        await query.edit_message_text(
-            text,
-            reply_markup=keyboard,
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
+        await sender.edit(query, text, keyboard)
 
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await start(update, context)
 
 
-async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    query = update.callback_query
-    data = load_data()
-    user = get_user_record(data, query.from_user.id)
-    cd = query.data
+# Main menu
 
-    await query.answer()
+async def _h_menu_main(query: CallbackQuery, user: UserState) -> None:
+    await sender.edit(query, main_menu_text(user), main_menu_keyboard(user))
 
-  # Main menu
-    if cd == "menu_main":
-        save_data(data)
-        await query.edit_message_text(
-            main_menu_text(user),
-            reply_markup=main_menu_keyboard(user),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
 
-    # Protocol and country selection
-    if cd == "choose_protocol":
-        await query.edit_message_text(
-            "⚙️ *Choose VPN protocol:*",
-            reply_markup=protocol_keyboard(),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
-
-    if cd == "choose_country":
-        await query.edit_message_text(
-            "🌍 *Choose VPN country:*",
-            reply_markup=country_keyboard(),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
+# Protocol and country selection
 
-    if cd == "set_proto_wg":
-        user["protocol"] = PROTOCOL_WG
-        save_data(data)
-        await query.edit_message_text(
-            "✅ Protocol set to *WireGuard*.\n\n" + main_menu_text(user),
-            reply_markup=main_menu_keyboard(user),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
+async def _h_set_proto_wg(query: CallbackQuery, user: UserState) -> None:
+    user.protocol = PROTOCOL_WG
+    store.mark_dirty(query.from_user.id)
+    await sender.edit(
+        query,
+        "✅ Protocol set to *WireGuard*.\n\n" + main_menu_text(user),
+        main_menu_keyboard(user),
+    )
 
-    if cd == "set_proto_ovpn":
-        user["protocol"] = PROTOCOL_OVPN
-        save_data(data)
-        await query.edit_message_text(
-            "✅ Protocol set to *OpenVPN*.\n\n" + main_menu_text(user),
-            reply_markup=main_menu_keyboard(user),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
 
-    if cd.startswith("set_country_"):
-        code = cd.split("_", maxsplit=2)[2]
-        if code in VPN_PROFILES:
-            user["country"] = code
-            save_data(data)
-            await query.edit_message_text(
-                f"✅ Country set to *{get_country_label(code)}*.\n\n" + main_menu_text(user),
-                reply_markup=main_menu_keyboard(user),
-                disable_web_page_preview=True,
-                parse_mode="Markdown",
-            )
-        else:
-            await query.edit_message_text(
-                "⚠️ Unknown country code.\n\n" + main_menu_text(user),
-                reply_markup=main_menu_keyboard(user),
-                disable_web_page_preview=True,
-                parse_mode="Markdown",
-            )
-        return
+async def _h_set_proto_ovpn(query: CallbackQuery, user: UserState) -> None:
+    user.protocol = PROTOCOL_OVPN
+    store.mark_dirty(query.from_user.id)
+    await sender.edit(
+        query,
+        "✅ Protocol set to *OpenVPN*.\n\n" + main_menu_text(user),
+        main_menu_keyboard(user),
+    )
 
-    # Get config flow
-    if cd == "get_config":
-        proto = user.get("protocol", DEFAULT_PROTOCOL)
-        country = user.get("country", DEFAULT_COUNTRY)
-        user["profiles_created"] += 1
-        save_data(data)
-
-        if proto == PROTOCOL_WG:
-            keyboard = InlineKeyboardMarkup(
-                [
-                    [
-                        InlineKeyboardButton("📱 Android", callback_data="wg_android"),
-                        InlineKeyboardButton("🍎 iOS", callback_data="wg_ios"),
-                    ],
-                    [InlineKeyboardButton("⬅️ Back", callback_data="menu_main")],
-                ]
-            )
-            await query.edit_message_text(
-                f"🛡️ *WireGuard config* for {get_country_label(country)}.\n"
-                "Choose your platform:",
-                reply_markup=keyboard,
-                disable_web_page_preview=True,
-                parse_mode="Markdown",
-            )
-        else:
-            keyboard = InlineKeyboardMarkup(
-                [
-                    [
-                        InlineKeyboardButton("📱 Android", callback_data="ovpn_android"),
-                        InlineKeyboardButton("🍎 iOS", callback_data="ovpn_ios"),
-                        InlineKeyboardButton("💻 Desktop", callback_data="ovpn_desktop"),
-                    ],
-                    [InlineKeyboardButton("⬅️ Back", callback_data="menu_main")],
-                ]
-            )
-            await query.edit_message_text(
-                f"🔐 *OpenVPN config* for {get_country_label(country)}.\n"
-                "Choose your platform:",
-                reply_markup=keyboard,
-                disable_web_page_preview=True,
-                parse_mode="Markdown",
-            )
-        return
 
-    # WireGuard platform-specific
-    if cd in ("wg_android", "wg_ios"):
-        country = user.get("country", DEFAULT_COUNTRY)
-        platform = "android" if cd == "wg_android" else "ios"
-        client_cfg, server_snippet = generate_wireguard_client_and_server(
-            query.from_user.id, country, platform
+async def _h_set_country(query: CallbackQuery, user: UserState, code: str) -> None:
+    label = COUNTRY_LABELS.get(code)
+    if label is not None:
+        user.country = code
+        store.mark_dirty(query.from_user.id)
+        await sender.edit(
+            query,
+            f"✅ Country set to *{label}*.\n\n" + main_menu_text(user),
+            main_menu_keyboard(user),
         )
-
-        # Text message with explanation + both client & server snippet
-        msg_text = (
-            f"🛡️ *WireGuard config* ({get_country_label(country)} – {platform})\n\n"
-            "📱 *Client config (import / QR text)*:\n"
-            "```ini\n"
-            f"{client_cfg}\n"
-            "```\n\n"
-            "🖥️ *Server-side snippet* (add to your `wg0.conf`):\n"
-            "```ini\n"
-            f"{server_snippet}\n"
-            "```\n\n"
-            "_Import the `.conf` file into WireGuard, then replace_ "
-            "`REPLACE_WITH_...` _with real keys & endpoint if needed._"
+    else:
+        await sender.edit(
+            query,
+            "⚠️ Unknown country code.\n\n" + main_menu_text(user),
+            main_menu_keyboard(user),
         )
 
-        # Reply with text, clean .conf, and optional QR
-        await query.message.reply_text(
-            msg_text,
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
 
-        # Clean client config as file (good for WireGuard app / scanner)
-        filename = f"{country}_wg_{platform}_{query.from_user.id}.conf"
-        cfg_file = build_config_file_bytes(client_cfg, filename)
-        await query.message.reply_document(
-            document=cfg_file,
-            filename=filename,
-            caption="🛡️ WireGuard client config (.conf) – import this into the WireGuard app.",
+# Get config flow
+
+async def _h_get_config(query: CallbackQuery, user: UserState) -> None:
+    proto = user.protocol
+    country = user.country
+    user.profiles_created += 1
+    store.mark_dirty(query.from_user.id)
+
+    if proto == PROTOCOL_WG:
+        await sender.edit(
+            query,
+            f"🛡️ *WireGuard config* for {get_country_label(country)}.\n"
+            "Choose your platform:",
+            WG_PLATFORM_KB,
+        )
+    else:
+        await sender.edit(
+            query,
+            f"🔐 *OpenVPN config* for {get_country_label(country)}.\n"
+            "Choose your platform:",
+            OVPN_PLATFORM_KB,
         )
 
-        # Optional QR code
-        if qrcode is not None:
-            try:
-                qr_bio = BytesIO()
-                img = qrcode.make(client_cfg)
-                img.save(qr_bio, format="PNG")
-                qr_bio.name = f"{country}_wg_{platform}_{query.from_user.id}_qr.png"
-                qr_bio.seek(0)
-                await query.message.reply_photo(
-                    photo=qr_bio,
-                    caption="📷 WireGuard QR – in the app tap “Add tunnel” → “Scan from QR code”.",
-                )
-            except Exception as e:
-                logger.warning("Failed to generate QR: %s", e)
-
-        # store last config for quick re-download
-        user["last_cfg_file"] = client_cfg
-        user["last_cfg_filename"] = filename
-        save_data(data)
-
-        # Delete the old inline menu message to keep chat clean
-        try:
-            await query.message.delete()
-        except Exception:
-            pass
 
-        return
+# WireGuard platform-specific
 
-    # OpenVPN platform-specific
-    if cd in ("ovpn_android", "ovpn_ios", "ovpn_desktop"):
-        country = user.get("country", DEFAULT_COUNTRY)
-        if cd == "ovpn_android":
-            platform = "android"
-        elif cd == "ovpn_ios":
-            platform = "ios"
-        else:
-            platform = "desktop"
-
-        cfg_text = generate_openvpn_client_config(
-            query.from_user.id, country, platform
-        )
+async def _send_wg_qr(message: Message, cfg_bytes: bytes, filename: str) -> Any:
+    return await sender.photo(
+        message,
+        photo=await render_qr(cfg_bytes),
+        filename=filename,
+        caption="📷 WireGuard QR – in the app tap “Add tunnel” → “Scan from QR code”.",
+    )
 
-        msg_text = (
-            f"🔐 *OpenVPN config* ({get_country_label(country)} – {platform})\n\n"
-            "Paste your real CA / client certificate / client key where marked.\n"
-            "Then import into OpenVPN and connect.\n\n"
-            "```conf\n"
-            f"{cfg_text}\n"
-            "```"
-        )
 
-        await query.message.reply_text(
-            msg_text,
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
+async def _h_wg_config(query: CallbackQuery, user: UserState) -> None:
+    country = user.country
+    platform = "android" if query.data == CB_WG_ANDROID else "ios"
+    client_cfg, server_snippet = generate_wireguard_client_and_server(
+        query.from_user.id, country, platform
+    )
 
-        filename = f"{country}_ovpn_{platform}_{query.from_user.id}.ovpn"
-        cfg_file = build_config_file_bytes(cfg_text, filename)
-        await query.message.reply_document(
-            document=cfg_file,
+    # Clean client config as file (good for WireGuard app / scanner).
+    # The server-side peer snippet goes into the old menu message below, so no
+    # separate preview message is sent.
+    filename = f"{country}_wg_{platform}_{query.from_user.id}.conf"
+    cfg_bytes = build_config_file_bytes(client_cfg)
+    sends = [
+        sender.document(
+            query.message,
+            document=cfg_bytes,
             filename=filename,
-            caption="🔐 OpenVPN client config (.ovpn) – fill in your real certs/keys.",
+            caption="🛡️ Import into WireGuard; placeholders need real keys.",
+        )
+    ]
+    # Optional QR code
+    if QR_ENABLED:
+        sends.append(
+            _send_wg_qr(
+                query.message,
+                cfg_bytes,
+                f"{country}_wg_{platform}_{query.from_user.id}_qr.png",
+            )
         )
 
-        user["last_cfg_file"] = cfg_text
-        user["last_cfg_filename"] = filename
-        save_data(data)
+    # Independent messages, so upload them concurrently; a failed QR must not
+    # lose the config and vice versa.
+    cfg_result, *qr_result = await asyncio.gather(*sends, return_exceptions=True)
+    if qr_result and isinstance(qr_result[0], BaseException):
+        if not isinstance(qr_result[0], (TelegramError, ChatThrottled, *QR_ERRORS)):
+            raise qr_result[0]
+        logger.warning("Failed to send WireGuard QR: %s", qr_result[0])
+    if isinstance(cfg_result, BaseException):
+        # ChatThrottled: a repeat tap while an earlier config is still on its
+        # way, dropped quietly by on_error
+        if not isinstance(cfg_result, TelegramError):
+            raise cfg_result
+        # no file arrived: keep the platform picker up so the user can retry
+        logger.warning("Failed to send WireGuard config: %s", cfg_result)
+        await sender.edit(query, CONFIG_SEND_FAILED_TEXT, WG_PLATFORM_KB)
+        return
 
-        # Delete old inline menu
-        try:
-            await query.message.delete()
-        except Exception:
-            pass
+    # store last config for quick re-download
+    user.last_cfg_file = client_cfg
+    user.last_cfg_filename = filename
+    store.set_cfg_bytes(query.from_user.id, cfg_bytes)
+    store.mark_dirty(query.from_user.id)
+
+    # Turn the old inline menu into the "config ready" note: an edit instead of
+    # a delete plus a fresh message, and it doesn't count as a new send.
+    await sender.edit(
+        query,
+        f"✅ *WireGuard config ready* ({get_country_label(country)} – {platform})\n\n"
+        "🖥️ *Server-side snippet* (add to your `wg0.conf`):\n"
+        "```ini\n"
+        f"{server_snippet}\n"
+        "```",
+        BACK_ONLY_KB,
+    )
 
-        return
 
-    # Help menus
-    if cd == "help_android":
-        await query.edit_message_text(
-            android_help_text(),
-            reply_markup=InlineKeyboardMarkup(
-                [[InlineKeyboardButton("⬅️ Back", callback_data="menu_main")]]
-            ),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
+# OpenVPN platform-specific
 
-    if cd == "help_ios":
-        await query.edit_message_text(
-            ios_help_text(),
-            reply_markup=InlineKeyboardMarkup(
-                [[InlineKeyboardButton("⬅️ Back", callback_data="menu_main")]]
-            ),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
+async def _h_ovpn_config(query: CallbackQuery, user: UserState) -> None:
+    country = user.country
+    if query.data == CB_OVPN_ANDROID:
+        platform = "android"
+    elif query.data == CB_OVPN_IOS:
+        platform = "ios"
+    else:
+        platform = "desktop"
 
-    # FAQ
-    if cd == "menu_faq":
-        await query.edit_message_text(
-            faq_intro_text(),
-            reply_markup=faq_keyboard(),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
+    cfg_text = generate_openvpn_client_config(
+        query.from_user.id, country, platform
+    )
 
-    if cd == "faq_overview":
-        await query.edit_message_text(
-            faq_intro_text(),
-            reply_markup=faq_keyboard(),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
+    filename = f"{country}_ovpn_{platform}_{query.from_user.id}.ovpn"
+    cfg_bytes = _OVPN_CONFIG_BYTES[country]
+    await sender.document(
+        query.message,
+        document=cfg_bytes,
+        filename=filename,
+        caption="🔐 Paste your real CA / client cert / key where marked, then import.",
+    )
 
-    if cd == "faq_legal":
-        await query.edit_message_text(
-            faq_legal_text(),
-            reply_markup=faq_keyboard(),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
+    user.last_cfg_file = cfg_text
+    user.last_cfg_filename = filename
+    store.set_cfg_bytes(query.from_user.id, cfg_bytes)
+    store.mark_dirty(query.from_user.id)
 
-    if cd == "faq_privacy":
-        await query.edit_message_text(
-            faq_privacy_text(),
-            reply_markup=faq_keyboard(),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
+    # Old inline menu becomes the "config ready" note
+    await sender.edit(
+        query,
+        f"✅ *OpenVPN config ready* ({get_country_label(country)} – {platform})",
+        BACK_ONLY_KB,
+    )
 
-    if cd == "faq_speed":
-        await query.edit_message_text(
-            faq_speed_text(),
-            reply_markup=faq_keyboard(),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
 
-    if cd == "faq_troubleshoot":
-        await query.edit_message_text(
-            faq_troubleshoot_text(),
-            reply_markup=faq_keyboard(),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
+# Account
 
-    # Tools & Tips
-    if cd == "menu_tools":
-        await query.edit_message_text(
-            "🧰 *Tools & tips*\n\nSelect a topic below:",
-            reply_markup=tools_keyboard(),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
+async def _h_menu_account(query: CallbackQuery, user: UserState) -> None:
+    text = (
+        "👤 *Account info*\n\n"
+        f"• Configs generated: `{user.profiles_created}`\n"
+        f"• Protocol: `{user.protocol}`\n"
+        f"• Country: `{get_country_label(user.country)}`\n"
+        f"• Last config file: `{user.last_cfg_filename or 'none'}`\n\n"
+        "Use the buttons below to download your last config or delete your data."
+    )
+    await sender.edit(query, text, ACCOUNT_KB)
 
-    if cd == "tools_basics":
-        await query.edit_message_text(
-            tools_basics_text(),
-            reply_markup=tools_keyboard(),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
 
-    if cd == "tools_wg_vs_ovpn":
-        await query.edit_message_text(
-            tools_wg_vs_ovpn_text(),
-            reply_markup=tools_keyboard(),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
+async def _h_account_last_cfg(query: CallbackQuery, user: UserState) -> None:
+    if not user.last_cfg_file:
+        await query.answer(
+            "No config stored yet. Generate one via “Get VPN Config”.",
+            show_alert=True,
         )
         return
 
-    if cd == "tools_public_wifi":
-        await query.edit_message_text(
-            tools_public_wifi_text(),
-            reply_markup=tools_keyboard(),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
+    filename = user.last_cfg_filename or "vpn_last.conf"
+    # the exact bytes uploaded last time; after a restart they are encoded on
+    # the first re-download and kept for the next ones
+    payload = store.get_cfg_bytes(query.from_user.id)
+    if payload is None:
+        payload = build_config_file_bytes(user.last_cfg_file)
+        store.set_cfg_bytes(query.from_user.id, payload)
+    await sender.document(
+        query.message,
+        document=payload,
+        filename=filename,
+        caption="📥 Your last generated config file.",
+    )
+    await query.answer("Last config sent.", show_alert=False)
 
-    if cd == "tools_streaming":
-        await query.edit_message_text(
-            tools_streaming_text(),
-            reply_markup=tools_keyboard(),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
 
-    if cd == "tools_gaming":
-        await query.edit_message_text(
-            tools_gaming_text(),
-            reply_markup=tools_keyboard(),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
+async def _h_account_delete(query: CallbackQuery, user: UserState) -> None:
+    store.delete_user(query.from_user.id)
+    await sender.edit(
+        query,
+        ACCOUNT_DELETED_TEXT,
+        parse_mode=None,
+    )
 
-    if cd == "tools_killswitch":
-        await query.edit_message_text(
-            tools_killswitch_text(),
-            reply_markup=tools_keyboard(),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
 
-    if cd == "tools_split_tunnel":
-        await query.edit_message_text(
-            tools_split_tunnel_text(),
-            reply_markup=tools_keyboard(),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
+# Language toggle (text currently only in English, but flag changes)
+
+async def _h_toggle_lang(query: CallbackQuery, user: UserState) -> None:
+    user.lang = "hi" if user.lang == "en" else "en"
+    store.mark_dirty(query.from_user.id)
+    await sender.edit(query, main_menu_text(user), main_menu_keyboard(user))
+
+
+# Pages whose text and keyboard never depend on the user:
+# callback_data -> (text, keyboard). No user record is looked up for these.
+STATIC_ROUTES: dict[str, tuple[str, InlineKeyboardMarkup]] = {
+    CB_CHOOSE_PROTOCOL: (CHOOSE_PROTOCOL_TEXT, PROTOCOL_KB),
+    CB_CHOOSE_COUNTRY: (CHOOSE_COUNTRY_TEXT, COUNTRY_KB),
+    CB_HELP_ANDROID: (ANDROID_HELP_TEXT, BACK_ONLY_KB),
+    CB_HELP_IOS: (IOS_HELP_TEXT, BACK_ONLY_KB),
+    CB_MENU_FAQ: (FAQ_INTRO_TEXT, FAQ_KB),
+    CB_FAQ_OVERVIEW: (FAQ_INTRO_TEXT, FAQ_KB),
+    CB_FAQ_LEGAL: (FAQ_LEGAL_TEXT, FAQ_KB),
+    CB_FAQ_PRIVACY: (FAQ_PRIVACY_TEXT, FAQ_KB),
+    CB_FAQ_SPEED: (FAQ_SPEED_TEXT, FAQ_KB),
+    CB_FAQ_TROUBLESHOOT: (FAQ_TROUBLESHOOT_TEXT, FAQ_KB),
+    CB_MENU_TOOLS: (TOOLS_INTRO_TEXT, TOOLS_KB),
+    CB_TOOLS_BASICS: (TOOLS_BASICS_TEXT, TOOLS_KB),
+    CB_TOOLS_WG_VS_OVPN: (TOOLS_WG_VS_OVPN_TEXT, TOOLS_KB),
+    CB_TOOLS_PUBLIC_WIFI: (TOOLS_PUBLIC_WIFI_TEXT, TOOLS_KB),
+    CB_TOOLS_STREAMING: (TOOLS_STREAMING_TEXT, TOOLS_KB),
+    CB_TOOLS_GAMING: (TOOLS_GAMING_TEXT, TOOLS_KB),
+    CB_TOOLS_KILLSWITCH: (TOOLS_KILLSWITCH_TEXT, TOOLS_KB),
+    CB_TOOLS_SPLIT_TUNNEL: (TOOLS_SPLIT_TUNNEL_TEXT, TOOLS_KB),
+    CB_TOOLS_ANDROID_TIPS: (TOOLS_ANDROID_TIPS_TEXT, TOOLS_KB),
+    CB_TOOLS_IOS_TIPS: (TOOLS_IOS_TIPS_TEXT, TOOLS_KB),
+    CB_TOOLS_PRIVACY_CHECK: (TOOLS_PRIVACY_CHECK_TEXT, TOOLS_KB),
+    CB_TOOLS_FIREWALL: (TOOLS_FIREWALL_TEXT, TOOLS_KB),
+}
 
-    if cd == "tools_android_tips":
-        await query.edit_message_text(
-            tools_android_tips_text(),
-            reply_markup=tools_keyboard(),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
+_Handler = Callable[[CallbackQuery, UserState], Awaitable[None]]
+
+# callback_data -> handler for the taps that read or change user state
+HANDLERS: dict[str, _Handler] = {
+    CB_MENU_MAIN: _h_menu_main,
+    CB_SET_PROTO_WG: _h_set_proto_wg,
+    CB_SET_PROTO_OVPN: _h_set_proto_ovpn,
+    CB_GET_CONFIG: _h_get_config,
+    CB_WG_ANDROID: _h_wg_config,
+    CB_WG_IOS: _h_wg_config,
+    CB_OVPN_ANDROID: _h_ovpn_config,
+    CB_OVPN_IOS: _h_ovpn_config,
+    CB_OVPN_DESKTOP: _h_ovpn_config,
+    CB_MENU_ACCOUNT: _h_menu_account,
+    CB_ACCOUNT_LAST_CFG: _h_account_last_cfg,
+    CB_ACCOUNT_DELETE: _h_account_delete,
+    CB_TOGGLE_LANG: _h_toggle_lang,
+}
 
-    if cd == "tools_ios_tips":
-        await query.edit_message_text(
-            tools_ios_tips_text(),
-            reply_markup=tools_keyboard(),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
+# set_country_<code>; the code is captured so the handler never re-splits it
+SET_COUNTRY_PATTERN = rf"^{CB_SET_COUNTRY}(\w+)$"
 
-    if cd == "tools_privacy_check":
-        await query.edit_message_text(
-            tools_privacy_check_text(),
-            reply_markup=tools_keyboard(),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
 
-    if cd == "tools_firewall":
-        await query.edit_message_text(
-            tools_firewall_text(),
-            reply_markup=tools_keyboard(),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        return
+# One CallbackQueryHandler per kind of button (see main()); PTB's pattern
+# filter picks the right one, so each of these only handles its own keys.
 
-    # Account
-    if cd == "menu_account":
-        text = (
-            "👤 *Account info*\n\n"
-            f"• Configs generated: `{user.get('profiles_created', 0)}`\n"
-            f"• Protocol: `{user.get('protocol', DEFAULT_PROTOCOL)}`\n"
-            f"• Country: `{get_country_label(user.get('country', DEFAULT_COUNTRY))}`\n"
-            f"• Last config file: `{user.get('last_cfg_filename') or 'none'}`\n\n"
-            "Use the buttons below to download your last config or delete your data."
-        )
-        await query.edit_message_text(
-            text,
-            reply_markup=account_keyboard(),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
-        save_data(data)
-        return
+async def handle_static_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer()
+    text, keyboard = STATIC_ROUTES[query.data]
+    await sender.edit(query, text, keyboard)
 
-    if cd == "account_last_cfg":
-        if not user.get("last_cfg_file"):
-            await query.answer(
-                "No config stored yet. Generate one via “Get VPN Config”.",
-                show_alert=True,
-            )
-            return
 
-        filename = user.get("last_cfg_filename") or "vpn_last.conf"
-        cfg_file = build_config_file_bytes(user["last_cfg_file"], filename)
-        await query.message.reply_document(
-            document=cfg_file,
-            filename=filename,
-            caption="📥 Your last generated config file.",
-        )
-        await query.answer("Last config sent.", show_alert=False)
-        return
+async def handle_user_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer()
+    await HANDLERS[query.data](query, store.get_user(query.from_user.id))
 
-    if cd == "account_delete":
-        uid = str(query.from_user.id)
-        if uid in data:
-            del data[uid]
-            save_data(data)
-        await query.edit_message_text(
-            "🗑️ Your bot data has been deleted.\n\nYou can use /start again anytime."
-        )
-        return
 
-    # Language toggle (text currently only in English, but flag changes)
-    if cd == "toggle_lang":
-        current = user.get("lang", "en")
-        user["lang"] = "hi" if current == "en" else "en"
-        save_data(data)
-        await query.edit_message_text(
-            main_menu_text(user),
-            reply_markup=main_menu_keyboard(user),
-            disable_web_page_preview=True,
-            parse_mode="Markdown",
-        )
+async def handle_set_country(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer()
+    user = store.get_user(query.from_user.id)
+    await _h_set_country(query, user, context.matches[0].group(1))
+
+
+async def on_error(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if isinstance(context.error, ChatThrottled):
+        # a user tapping faster than their chat may be sent to; expected
+        logger.info("Dropped send: %s", context.error)
         return
+    logger.error("Exception while handling an update", exc_info=context.error)
+
+
+async def handle_unknown_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # buttons from an older bot version: just stop the client's spinner
+    await update.callback_query.answer()
 
 
 # ========================
@@ -1097,13 +1433,46 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 # ========================
 
 def main() -> None:
-    application = Application.builder().token(BOT_TOKEN).build()
+    if uvloop is not None:
+        # before run_polling creates the loop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .request(
+            HTTPXRequest(
+                connection_pool_size=HTTP_POOL_SIZE,
+                http_version=HTTP_VERSION,
+                read_timeout=30,
+                write_timeout=30,  # document / QR uploads
+                pool_timeout=5,
+            )
+        )
+        # long polling holds its connection open, so it gets its own client
+        .get_updates_request(HTTPXRequest(http_version=HTTP_VERSION))
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .post_init(store.start)
+        .post_shutdown(store.stop)
+        .build()
+    )
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CallbackQueryHandler(handle_callback))
+    application.add_handler(
+        CallbackQueryHandler(handle_static_page, pattern=STATIC_ROUTES.__contains__)
+    )
+    application.add_handler(
+        CallbackQueryHandler(handle_user_action, pattern=HANDLERS.__contains__)
+    )
+    application.add_handler(
+        CallbackQueryHandler(handle_set_country, pattern=SET_COUNTRY_PATTERN)
+    )
+    application.add_handler(CallbackQueryHandler(handle_unknown_callback))
+    application.add_error_handler(on_error)
 
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    # only the update kinds the handlers above consume
+    application.run_polling(allowed_updates=[Update.MESSAGE, Update.CALLBACK_QUERY])
 
 
 if __name__ == "__main__":